@@ -5,8 +5,11 @@ FastAPI-based REST API for production deployment
 
 from fastapi import FastAPI, HTTPException, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
 from typing import Optional, List
+import os
 import time
 from prompt_injection_detector import (
     PromptInjectionDetector,
@@ -19,7 +22,8 @@ from prompt_injection_detector import (
 app = FastAPI(
     title="Prompt Injection Detection API",
     description="Multi-layered detection system for LLM prompt injections",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -54,6 +58,26 @@ class DetectionRequest(BaseModel):
         }
 
 
+class BatchRequest(BaseModel):
+    """Request model for batch detection"""
+    prompts: List[str] = Field(..., description="The prompts to analyze", min_length=1, max_length=100)
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "prompts": ["Tell me about the weather", "Ignore all previous instructions"]
+            }
+        }
+
+
+class FlaggedSegment(BaseModel):
+    """A flagged span of the prompt, as [start, end) character offsets"""
+    segment: str
+    category: str
+    start: int
+    end: int
+
+
 class DetectionResponse(BaseModel):
     """Response model for detection results"""
     safe: bool
@@ -62,8 +86,9 @@ class DetectionResponse(BaseModel):
     confidence: float
     explanation: str
     detected_patterns: List[str]
-    flagged_segments: List[dict]
+    flagged_segments: List[FlaggedSegment]
     sanitized_prompt: Optional[str] = None
+    early_exit: bool = False
     processing_time_ms: float
     
     class Config:
@@ -75,8 +100,11 @@ class DetectionResponse(BaseModel):
                 "confidence": 0.92,
                 "explanation": "Detected instruction override attempt",
                 "detected_patterns": ["instruction_override: ignore previous"],
-                "flagged_segments": [{"segment": "ignore all", "category": "instruction_override"}],
+                "flagged_segments": [
+                    {"segment": "ignore all", "category": "instruction_override", "start": 0, "end": 10}
+                ],
                 "sanitized_prompt": None,
+                "early_exit": False,
                 "processing_time_ms": 12.5
             }
         }
@@ -120,7 +148,9 @@ async def health_check():
     }
 
 
-@app.post("/api/v1/detect", response_model=DetectionResponse)
+# Responses are built as plain dicts and returned directly, so FastAPI does
+# not re-validate them; the response models only document the schema
+@app.post("/api/v1/detect", responses={200: {"model": DetectionResponse}})
 async def detect_injection(
     request: DetectionRequest,
     api_key: str = Depends(verify_api_key)
@@ -134,8 +164,8 @@ async def detect_injection(
     start_time = time.time()
     
     try:
-        # Run detection
-        result = detector.detect(request.prompt)
+        # Run detection off the event loop; it is synchronous CPU work
+        result = await run_in_threadpool(detector.detect, request.prompt)
         
         # Log the detection
         monitor.log_detection(request.prompt, result)
@@ -148,26 +178,30 @@ async def detect_injection(
             # Higher thresholds for permissive policy
             pass
         
+        threat_value = result.threat_level.value
+        
         # Sanitize if requested
         sanitized = None
-        if request.sanitize and result.threat_level.value > 1:
+        if request.sanitize and threat_value > 1:
             sanitized = sanitizer.sanitize(request.prompt, result)
         
         # Calculate processing time
         processing_time = (time.time() - start_time) * 1000
         
-        # Build response
-        return DetectionResponse(
-            safe=result.threat_level.value == 0,
-            threat_level=result.threat_level.name,
-            risk_score=result.risk_score,
-            confidence=result.confidence,
-            explanation=result.explanation,
-            detected_patterns=result.detected_patterns[:10],  # Limit to first 10
-            flagged_segments=result.flagged_segments[:10],
-            sanitized_prompt=sanitized,
-            processing_time_ms=round(processing_time, 2)
-        )
+        response = {
+            "safe": threat_value == 0,
+            "threat_level": result.threat_level.name,
+            "risk_score": result.risk_score,
+            "confidence": result.confidence,
+            "explanation": result.explanation,
+            "detected_patterns": result.detected_patterns[:10],  # Limit to first 10
+            "flagged_segments": result.flagged_segments[:10],
+            "early_exit": result.early_exit,
+            "processing_time_ms": round(processing_time, 2)
+        }
+        if sanitized is not None:
+            response["sanitized_prompt"] = sanitized
+        return ORJSONResponse(response)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Detection error: {str(e)}")
@@ -175,7 +209,7 @@ async def detect_injection(
 
 @app.post("/api/v1/batch-detect")
 async def batch_detect(
-    prompts: List[str] = Field(..., max_length=100),
+    request: BatchRequest,
     api_key: str = Depends(verify_api_key)
 ):
     """
@@ -184,9 +218,11 @@ async def batch_detect(
     Efficiently processes multiple prompts in a single request.
     """
     results = []
+    batch = request.prompts
+    
+    batch_results = await run_in_threadpool(detector.detect_many, batch)
     
-    for prompt in prompts[:100]:  # Limit to 100 prompts
-        result = detector.detect(prompt)
+    for prompt, result in zip(batch, batch_results):
         monitor.log_detection(prompt, result)
         
         results.append({
@@ -196,10 +232,10 @@ async def batch_detect(
             "risk_score": result.risk_score
         })
     
-    return {"results": results, "total": len(results)}
+    return ORJSONResponse({"results": results, "total": len(results)})
 
 
-@app.get("/api/v1/stats", response_model=StatsResponse)
+@app.get("/api/v1/stats", responses={200: {"model": StatsResponse}})
 async def get_statistics(api_key: str = Depends(verify_api_key)):
     """
     Get detection statistics
@@ -208,12 +244,12 @@ async def get_statistics(api_key: str = Depends(verify_api_key)):
     """
     stats = monitor.get_statistics()
     
-    return StatsResponse(
-        total_detections=stats.get('total_detections', 0),
-        threat_distribution=stats.get('threat_distribution', {}),
-        avg_risk_score=stats.get('avg_risk_score', 0.0),
-        uptime_seconds=time.time() - app.state.start_time if hasattr(app.state, 'start_time') else 0
-    )
+    return ORJSONResponse({
+        "total_detections": stats.get('total_detections', 0),
+        "threat_distribution": stats.get('threat_distribution', {}),
+        "avg_risk_score": stats.get('avg_risk_score', 0.0),
+        "uptime_seconds": time.time() - app.state.start_time if hasattr(app.state, 'start_time') else 0
+    })
 
 
 @app.get("/api/v1/patterns")
@@ -231,7 +267,7 @@ async def get_patterns(
             raise HTTPException(status_code=404, detail=f"Category '{category}' not found")
         return {
             "category": category,
-            "patterns": detector.patterns[category][:10],  # Limit output
+            "patterns": [p.pattern for p in detector.patterns[category][:10]],  # Limit output
             "weight": detector.weights[category]
         }
     
@@ -258,4 +294,15 @@ async def shutdown_event():
 # Run with: uvicorn api_service:app --reload --port 8000
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Detection is synchronous CPU work, so scale with one worker per core.
+    # uvloop and httptools come with uvicorn[standard]. Note that each worker
+    # keeps its own monitor, so /api/v1/stats is per process.
+    uvicorn.run(
+        "api_service:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=os.cpu_count(),
+        loop="uvloop",
+        http="httptools",
+        log_level="warning"
+    )
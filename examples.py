@@ -50,7 +50,7 @@ def example_2_with_sanitization():
     print(f"Original: {user_input}")
     print(f"Risk score: {result.risk_score:.1f}")
     
-    if result.threat_level.value >= ThreatLevel.MEDIUM.value:
+    if result.threat_level >= ThreatLevel.MEDIUM:
         sanitized = sanitizer.sanitize(user_input, result)
         print(f"Sanitized: {sanitized}")
         print("Using sanitized version for LLM")
@@ -78,7 +78,7 @@ def example_3_llm_integration():
             return "ERROR: Request blocked for security reasons"
         
         # Step 3: Sanitize if needed
-        if result.threat_level.value >= ThreatLevel.MEDIUM.value:
+        if result.threat_level >= ThreatLevel.MEDIUM:
             user_prompt = sanitizer.sanitize(user_prompt, result)
         
         # Step 4: Call LLM (simulated)
@@ -189,7 +189,7 @@ def example_6_real_world_scenario():
             
             if result.threat_level == ThreatLevel.CRITICAL:
                 response['message'] = "I cannot process this request."
-            elif result.threat_level.value >= ThreatLevel.MEDIUM.value:
+            elif result.threat_level >= ThreatLevel.MEDIUM:
                 # Sanitize and warn
                 sanitized = self.sanitizer.sanitize(user_message, result)
                 response['allowed'] = True
@@ -4,14 +4,314 @@ A multi-layered detection system for identifying potential prompt injection atta
 """
 
 import re
+import functools
 import json
-from typing import Dict, List, Tuple, Optional
-from dataclasses import dataclass, asdict
-from enum import Enum
+import threading
+from collections import Counter, OrderedDict, deque
+from typing import Dict, Iterator, List, NamedTuple, Sequence, Tuple, Optional
+from dataclasses import dataclass
+from enum import IntEnum, IntFlag
 import hashlib
 
+try:
+    import hyperscan
+except ImportError:  # optional: SIMD prefilter for the pattern scan
+    hyperscan = None
 
-class ThreatLevel(Enum):
+try:
+    import ahocorasick
+except ImportError:  # optional: one-pass keyword counting
+    ahocorasick = None
+
+try:
+    import re2
+except ImportError:  # optional: linear-time (DFA) scanning of ASCII prompts
+    re2 = None
+
+try:
+    import numba
+    import numpy as np
+except ImportError:  # optional: single-pass native character statistics
+    numba = None
+
+
+# Heuristic and structural feature regexes, compiled once at import
+_SPECIAL_CHAR_RE = re.compile(r'[^a-zA-Z0-9\s]')
+# ASCII bytes that are not special: letters, digits and whitespace
+_NON_SPECIAL_BYTES = bytes(i for i in range(128) if chr(i).isalnum() or chr(i).isspace())
+_CAPS_RE = re.compile(r'[A-Z]{10,}')
+_INSTRUCTION_WORDS = ('ignore', 'disregard', 'forget', 'override', 'bypass')
+_SYSTEM_KEYWORDS = ('system', 'admin', 'root', 'developer', 'debug')
+_INSTR_WORDS_RE = re.compile('|'.join(_INSTRUCTION_WORDS))
+_DELIM_RE = re.compile(r'[```\[\]<>|#]{3,}')
+_DELIM_CHARS = '`[]<>|#'
+_NESTED_RE = re.compile(r'\[.*\[.*\].*\]')
+_CYRILLIC_RE = re.compile(r'[а-яА-Я]')
+_LATIN_RE = re.compile(r'[a-zA-Z]')
+_CODE_RES = [
+    re.compile(r'eval\s*\('),
+    re.compile(r'exec\s*\('),
+    re.compile(r'__import__'),
+    re.compile(r'system\s*\('),
+]
+# Literal prefixes of _CODE_RES; if none occur the regexes cannot match
+_CODE_MARKERS = ('eval', 'exec', '__import__', 'system')
+# Every match of a default pattern contains at least one of its category's
+# keywords (the tests check this against the patterns), so a category can be
+# skipped for a case-folded prompt without any of them
+_CATEGORY_TRIGGERS = {
+    'instruction_override': ('ignore', 'instruction', 'prompt'),
+    'role_manipulation': ('now', 'act', 'pretend', 'role', 'system'),
+    'prompt_leakage': ('instruction', 'prompt', 'programmed'),
+    'delimiter_injection': ('```', '<|', '[inst', 'instruction', 'system'),
+    'obfuscation': ('base64', 'rot13', 'hex', 'unicode', '\\x', '&#'),
+    'jailbreak': ('mode', 'jailbreak', 'bypass'),
+    'context_manipulation': ('conversation', 'chat', 'session', 'context', 'memory'),
+    'goal_hijacking': ('goal', 'instead', 'follow', 'obey', 'listen', 'prioritize'),
+}
+_TRIGGER_KEYWORDS = tuple(dict.fromkeys(
+    keyword for triggers in _CATEGORY_TRIGGERS.values() for keyword in triggers
+))
+
+
+def _build_keyword_automaton(words: Tuple[str, ...]):
+    """Build an Aho-Corasick automaton whose payload is the matched word"""
+    automaton = ahocorasick.Automaton()
+    for word in words:
+        automaton.add_word(word, word)
+    automaton.make_automaton()
+    return automaton
+
+
+# Instruction word finder over the case-folded prompt. iter_long yields
+# leftmost, non-overlapping matches, the same occurrences re.findall reports;
+# no instruction word can overlap another, so these are also each word's own
+# occurrences.
+if ahocorasick is not None:
+    _INSTR_AC = _build_keyword_automaton(_INSTRUCTION_WORDS)
+    
+    def _find_instruction_words(lower: str) -> List[str]:
+        return [word for _, word in _INSTR_AC.iter_long(lower)]
+else:
+    _find_instruction_words = _INSTR_WORDS_RE.findall
+
+
+def _count_system_keywords(lower: str) -> int:
+    """
+    Sum of each system keyword's occurrences in the case-folded prompt,
+    counted separately: keywords may overlap ("developeroot" holds both
+    "developer" and "root"), which a single alternation would count once
+    """
+    return sum(map(lower.count, _SYSTEM_KEYWORDS))
+
+
+class _CharStats(NamedTuple):
+    """Per-character features shared by heuristic and structural analysis"""
+    length: int
+    special_count: int  # characters outside [a-zA-Z0-9\s]
+    max_caps_run: int  # longest run of A-Z (0 if shorter than 10)
+    delimiter_runs: int  # runs of 3+ delimiter characters
+    system_keywords: int  # per-keyword occurrences of _SYSTEM_KEYWORDS, summed
+    nested_brackets: bool  # [..[..]..] on a single line
+    has_cyrillic: bool
+    has_latin: bool
+
+
+def _regex_char_stats(prompt: str, lower: str) -> _CharStats:
+    """Compute character statistics with the compiled feature regexes"""
+    # Skip the scans whose characters cannot occur in the prompt; isascii()
+    # is a flag check and a single-character `in` is a memchr
+    has_delimiters = any(char in prompt for char in _DELIM_CHARS)
+    if prompt.isascii():
+        # Deleting the non-special bytes leaves exactly the special ones
+        special_count = len(prompt.encode('ascii').translate(None, _NON_SPECIAL_BYTES))
+    else:
+        special_count = len(_SPECIAL_CHAR_RE.findall(prompt))
+    return _CharStats(
+        length=len(prompt),
+        special_count=special_count,
+        max_caps_run=max(map(len, _CAPS_RE.findall(prompt)), default=0),
+        delimiter_runs=len(_DELIM_RE.findall(prompt)) if has_delimiters else 0,
+        system_keywords=_count_system_keywords(lower),
+        nested_brackets='[' in prompt and _NESTED_RE.search(prompt) is not None,
+        has_cyrillic=not prompt.isascii() and _CYRILLIC_RE.search(prompt) is not None,
+        has_latin=_LATIN_RE.search(prompt) is not None,
+    )
+
+
+if numba is not None:
+    @numba.njit(cache=True)
+    def _is_space(c):
+        """Mirror of re's whitespace class for str patterns (i.e. str.isspace)"""
+        if c <= 0x20:
+            return 0x09 <= c <= 0x0D or 0x1C <= c <= 0x20
+        if c < 0x85:
+            return False
+        return (c == 0x85 or c == 0xA0 or c == 0x1680 or 0x2000 <= c <= 0x200A or
+                c == 0x2028 or c == 0x2029 or c == 0x202F or c == 0x205F or c == 0x3000)
+    
+    # Compiled eagerly, at import, for the two input encodings: ASCII bytes
+    # and UTF-32 code points (both read-only views from np.frombuffer)
+    _KERNEL_SIGNATURES = [
+        (text_type,)
+        for text_type in (
+            numba.types.Array(numba.types.uint8, 1, 'C', readonly=True),
+            numba.types.Array(numba.types.uint32, 1, 'C', readonly=True),
+        )
+    ]
+    
+    @numba.njit(_KERNEL_SIGNATURES, cache=True)
+    def _char_stats_kernel(text):
+        """Single pass over code points computing the per-character _CharStats fields"""
+        n = text.size
+        special = 0
+        caps_run = 0
+        max_caps_run = 0
+        delim_run = 0
+        delim_runs = 0
+        nested_state = 0
+        nested = False
+        cyrillic = False
+        latin = False
+        for i in range(n):
+            c = text[i]
+            is_upper = 0x41 <= c <= 0x5A
+            if is_upper or 0x61 <= c <= 0x7A:
+                latin = True
+            elif not (0x30 <= c <= 0x39 or _is_space(c)):
+                special += 1
+            
+            if is_upper:
+                caps_run += 1
+                if caps_run > max_caps_run:
+                    max_caps_run = caps_run
+            else:
+                caps_run = 0
+            
+            # ` [ ] < > | #
+            if c == 0x60 or c == 0x5B or c == 0x5D or c == 0x3C or c == 0x3E or c == 0x7C or c == 0x23:
+                delim_run += 1
+                if delim_run == 3:
+                    delim_runs += 1
+            else:
+                delim_run = 0
+            
+            # Subsequence '[', '[', ']', ']' within one line
+            if c == 0x0A:
+                nested_state = 0
+            elif (c == 0x5B and nested_state < 2) or (c == 0x5D and nested_state >= 2):
+                nested_state += 1
+                if nested_state == 4:
+                    nested = True
+            
+            if 0x410 <= c <= 0x44F:
+                cyrillic = True
+        
+        if max_caps_run < 10:
+            max_caps_run = 0
+        return special, max_caps_run, delim_runs, nested, cyrillic, latin
+    
+    def _code_points(text: str, ascii: bool):
+        if ascii:  # one byte per code point, a quarter of UTF-32
+            return np.frombuffer(text.encode('ascii'), dtype=np.uint8)
+        return np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+    
+    def _char_stats(prompt: str, lower: str) -> _CharStats:
+        """Compute character statistics in one native pass"""
+        special, max_caps_run, delimiter_runs, nested, cyrillic, latin = _char_stats_kernel(
+            _code_points(prompt, prompt.isascii())
+        )
+        return _CharStats(
+            len(prompt), special, max_caps_run, delimiter_runs,
+            _count_system_keywords(lower), nested, cyrillic, latin
+        )
+else:
+    _char_stats = _regex_char_stats
+
+# Prompts are lower-cased once and matched against lower-case patterns. These
+# are the only characters re.IGNORECASE folds onto an ASCII letter that
+# str.lower() does not; mapping them first also keeps lower() length-preserving
+# (U+0130 would otherwise lower to two code points), so match offsets remain
+# valid in the original prompt.
+_CASE_FOLD_TABLE = str.maketrans({'\u0130': 'i', '\u0131': 'i', '\u017f': 's'})
+
+# Splits a pattern into escapes, character classes and single characters. A
+# class may start with ] and may contain escapes, including an escaped ].
+_REGEX_TOKEN_RE = re.compile(r'\\.|\[\^?\]?(?:\\.|[^\]\\])*\]|.', re.DOTALL)
+# Splits the inside of a character class into escapes and single characters
+_CLASS_ITEM_RE = re.compile(r'\\.|.', re.DOTALL)
+
+# Python's re and Hyperscan disagree on a few Unicode classes: Hyperscan
+# ships older Unicode tables and leaves \x1c-\x1f out of \s. These tokens are
+# widened in the Hyperscan expressions so that, for the default patterns, the
+# prefilter can only over-report; the re scan remains authoritative for what
+# is actually flagged. Custom patterns are not prefiltered (see
+# _compile_pattern_tables).
+_HS_WIDENED_TOKENS = {
+    r'\s': r'[\s\x1c-\x1f]',
+    r'\w': r'[^\x00-\x2f\x3a-\x40\x5b-\x5e\x60\x7b-\x7f]',
+    r'\d': r'[^\x00-\x2f\x3a-\x7f]',
+}
+
+# RE2's \s is [\t\n\f\r ], while re's also covers \v and \x1c-\x1f. With the
+# class spelled out both engines agree on ASCII text (\w and \d are ASCII-only
+# in RE2), so RE2 is only used for ASCII prompts.
+_RE2_ASCII_TOKENS = {r'\s': r'[\t-\r\x1c-\x20]'}
+
+
+def _translate_tokens(pattern: str, replacements: Dict[str, str]) -> str:
+    """Rewrite the escapes/characters of a pattern listed in ``replacements``"""
+    return ''.join(
+        replacements.get(token, token) for token in _REGEX_TOKEN_RE.findall(pattern)
+    )
+
+
+def _widen_class(token: str) -> str:
+    """
+    Widen a character class token for Hyperscan like _HS_WIDENED_TOKENS.
+    Only \\s in a non-negated class can be widened in place; a class using
+    any other shorthand raises ValueError, as its Hyperscan form could
+    miss characters re matches.
+    """
+    negated = token.startswith('[^')
+    items = _CLASS_ITEM_RE.findall(token[2 if negated else 1:-1])
+    widened = []
+    for item in items:
+        if item in (r'\s', r'\S', r'\w', r'\W', r'\d', r'\D'):
+            if negated or item != r'\s':
+                raise ValueError(f"cannot widen {item} in {token} for Hyperscan")
+            item = r'\s\x1c-\x1f'
+        widened.append(item)
+    return ('[^' if negated else '[') + ''.join(widened) + ']'
+
+
+def _to_hyperscan_expression(pattern: str) -> bytes:
+    """Translate a detection pattern into a (superset) Hyperscan expression"""
+    return ''.join(
+        _widen_class(token) if token.startswith('[') and len(token) > 1
+        else _HS_WIDENED_TOKENS.get(token, token)
+        for token in _REGEX_TOKEN_RE.findall(pattern)
+    ).encode('utf-8')
+
+
+def _to_re2_expression(pattern: str) -> str:
+    """
+    Translate a detection pattern for RE2 on ASCII text, making its groups
+    non-capturing (submatch extraction dominates RE2's per-match cost)
+    """
+    tokens = _REGEX_TOKEN_RE.findall(_translate_tokens(pattern, _RE2_ASCII_TOKENS))
+    return ''.join(
+        '(?:' if token == '(' and tokens[i + 1:i + 2] != ['?'] else token
+        for i, token in enumerate(tokens)
+    )
+
+
+def _collect_pattern_id(pattern_id, start, end, flags, pattern_ids):
+    """Hyperscan match handler: record which pattern fired (once, SINGLEMATCH)"""
+    pattern_ids.append(pattern_id)
+
+
+class ThreatLevel(IntEnum):
     """Threat severity levels"""
     SAFE = 0
     LOW = 1
@@ -20,111 +320,519 @@ class ThreatLevel(Enum):
     CRITICAL = 4
 
 
-@dataclass
+class Category(IntFlag):
+    """Built-in pattern categories, as bits of DetectionResult.category_mask"""
+    INSTRUCTION_OVERRIDE = 1
+    ROLE_MANIPULATION = 2
+    PROMPT_LEAKAGE = 4
+    DELIMITER_INJECTION = 8
+    OBFUSCATION = 16
+    JAILBREAK = 32
+    CONTEXT_MANIPULATION = 64
+    GOAL_HIJACKING = 128
+
+
+# Category names as used in detector.patterns
+_CATEGORY_BY_NAME = {category.name.lower(): category for category in Category}
+
+
+class _PatternLabels(Sequence):
+    """
+    Read-only list of "category: pattern" labels, stored as pattern ids into
+    the detector's shared label table so the match loop allocates no strings
+    """
+    __slots__ = ('_ids', '_labels')
+    
+    def __init__(self, ids: List[int], labels: Tuple[str, ...]):
+        self._ids = ids
+        self._labels = labels
+    
+    def __len__(self):
+        return len(self._ids)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._labels[i] for i in self._ids[index]]
+        return self._labels[self._ids[index]]
+    
+    def __eq__(self, other):
+        return isinstance(other, Sequence) and list(self) == list(other)
+    
+    def __repr__(self):
+        return repr(list(self))
+
+
+class _FlaggedSegments(Sequence):
+    """
+    Read-only list of flagged segment dicts, stored as (start, end, pattern id)
+    spans over the prompt and expanded to dicts only when accessed
+    """
+    __slots__ = ('_prompt', '_spans', '_categories')
+    
+    def __init__(self, prompt: str, spans: List[Tuple[int, int, int]], categories: Tuple[str, ...]):
+        self._prompt = prompt
+        self._spans = spans
+        self._categories = categories
+    
+    def _expand(self, span: Tuple[int, int, int]) -> Dict:
+        start, end, pattern_id = span
+        return {
+            'segment': self._prompt[start:end],
+            'category': self._categories[pattern_id],
+            'start': start,
+            'end': end
+        }
+    
+    def __len__(self):
+        return len(self._spans)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._expand(span) for span in self._spans[index]]
+        return self._expand(self._spans[index])
+    
+    def __eq__(self, other):
+        return isinstance(other, Sequence) and list(self) == list(other)
+    
+    def __repr__(self):
+        return repr(list(self))
+
+
+@dataclass(slots=True, frozen=True)
 class DetectionResult:
     """Result of a prompt injection detection"""
     threat_level: ThreatLevel
     confidence: float  # 0.0 to 1.0
-    detected_patterns: List[str]
+    detected_patterns: Sequence[str]
     risk_score: float  # 0.0 to 100.0
     explanation: str
-    flagged_segments: List[Dict[str, str]]
+    flagged_segments: Sequence[Dict]
+    early_exit: bool = False  # True if heuristics were skipped at a confident CRITICAL
+    # Built-in categories with at least one match (custom categories have no bit)
+    category_mask: Category = Category(0)
+    
+    def has(self, category: Category) -> bool:
+        """Whether any detected pattern belongs to the given category"""
+        return bool(self.category_mask & category)
+    
+    def has_category(self, name: str) -> bool:
+        """Whether any detected pattern belongs to the named category, built-in or custom"""
+        category = _CATEGORY_BY_NAME.get(name)
+        if category is not None:
+            return self.has(category)
+        return any(segment['category'] == name for segment in self.flagged_segments)
     
     def to_dict(self):
+        # Built field by field: asdict() would deep-copy the nested lists
         return {
-            **asdict(self),
-            'threat_level': self.threat_level.name
+            'threat_level': self.threat_level.name,
+            'confidence': self.confidence,
+            'detected_patterns': list(self.detected_patterns),
+            'risk_score': self.risk_score,
+            'explanation': self.explanation,
+            'flagged_segments': list(self.flagged_segments),
+            'early_exit': self.early_exit,
+            'category_mask': int(self.category_mask),
         }
 
 
+# Shared result for every prompt with no pattern matches and a zero risk
+# score; it is returned by reference, so it must never be mutated
+_SAFE_RESULT = DetectionResult(
+    threat_level=ThreatLevel.SAFE,
+    confidence=0.5,
+    detected_patterns=(),
+    risk_score=0.0,
+    explanation="No significant prompt injection patterns detected.",
+    flagged_segments=()
+)
+
+
+# Detection patterns by category. They are lower-case and matched against
+# the case-folded prompt, so they are compiled without IGNORECASE.
+_PATTERN_SOURCES = {
+    # Direct instruction injection
+    'instruction_override': [
+        r'ignore\s+(all\s+)?(previous|above|prior)\s+(instructions?|prompts?|directions?)',
+        r'disregard\s+(previous|above|prior)\s+(instructions?|prompts?)',
+        r'forget\s+(all\s+)?(previous|above|prior)\s+(instructions?|prompts?)',
+        r'new\s+instructions?:',
+        r'system\s*:\s*ignore',
+    ],
+    
+    # Role manipulation
+    'role_manipulation': [
+        r'you\s+are\s+now\s+(a|an)\s+\w+',
+        r'act\s+as\s+(a|an)\s+\w+',
+        r'pretend\s+(you\s+are|to\s+be)',
+        r'from\s+now\s+on,?\s+you',
+        r'your\s+new\s+role\s+is',
+        r'system\s*:\s*you\s+are',
+    ],
+    
+    # System prompt leakage attempts
+    'prompt_leakage': [
+        r'what\s+(are|were)\s+your\s+(original|initial|system)\s+(instructions?|prompts?)',
+        r'show\s+(me\s+)?(your\s+)?(system\s+)?(prompt|instructions?)',
+        r'print\s+(your\s+)?(system\s+)?(prompt|instructions?)',
+        r'reveal\s+(your\s+)?(system\s+)?(prompt|instructions?)',
+        r'what\s+are\s+you\s+programmed\s+to',
+    ],
+    
+    # Delimiter manipulation
+    'delimiter_injection': [
+        r'```\s*(system|assistant|user)',
+        r'<\|system\|>',
+        r'<\|assistant\|>',
+        r'<\|end\|>',
+        r'###\s*(instruction|system)',
+        r'\[system\]',
+        r'\[inst\]',
+    ],
+    
+    # Encoding/obfuscation attempts
+    'obfuscation': [
+        r'base64\s*:',
+        r'rot13\s*:',
+        r'hex\s*:',
+        r'unicode\s*:',
+        r'\\x[0-9a-f]{2}',
+        r'&#\d+;',
+    ],
+    
+    # Jailbreak attempts
+    'jailbreak': [
+        r'dan\s+mode',
+        r'developer\s+mode',
+        r'evil\s+(mode|mode)',
+        r'jailbreak',
+        r'unrestricted\s+mode',
+        r'bypass\s+(safety|filter|restriction)',
+    ],
+    
+    # Context manipulation
+    'context_manipulation': [
+        r'end\s+of\s+(conversation|chat|session)',
+        r'start\s+new\s+(conversation|chat|session)',
+        r'reset\s+(conversation|context)',
+        r'clear\s+(all\s+)?(previous\s+)?(context|memory)',
+    ],
+    
+    # Goal hijacking
+    'goal_hijacking': [
+        r'your\s+(real|actual|true)\s+goal\s+is',
+        r'instead\s+of\s+.*?,\s+you\s+(should|must|will)',
+        r'do\s+not\s+(follow|obey|listen\s+to)',
+        r'prioritize\s+this\s+over',
+    ],
+}
+
+_DEFAULT_PATTERNS = {
+    category: [re.compile(pattern) for pattern in patterns]
+    for category, patterns in _PATTERN_SOURCES.items()
+}
+
+
+class _PatternTables(NamedTuple):
+    """Tables derived from a pattern set, indexed by pattern id"""
+    patterns: Tuple[re.Pattern, ...]
+    categories: Tuple[str, ...]
+    labels: Tuple[str, ...]
+    category_bits: Tuple[int, ...]
+    scores: Tuple[float, ...]
+    re2_combined: Optional[object]
+    hs_db: Optional[object]
+    hs_ascii_db: Optional[object]
+    # (trigger keywords, pattern ids) per category, keywords None if unscreened
+    trigger_groups: Tuple[Tuple[Optional[frozenset], Tuple[int, ...]], ...]
+    keyword_screen: bool  # every category is screened
+
+
+def _build_combined_pattern(patterns: Tuple[re.Pattern, ...]):
+    """
+    Fuse the patterns into a single group-free RE2 alternation so an ASCII
+    prompt is scanned once, in linear time. Returns None when re2 is
+    unavailable or rejects the alternation.
+    """
+    if re2 is None:
+        return None
+    
+    alternative = '|'.join(
+        f"(?{'i' if pattern.flags & re.IGNORECASE else ''}:{_to_re2_expression(pattern.pattern)})"
+        for pattern in patterns
+    )
+    try:
+        return re2.compile(alternative)
+    except re2.error:
+        return None
+
+
+def _build_hyperscan_database(patterns: Tuple[re.Pattern, ...], utf8: bool):
+    """
+    Compile the patterns into a Hyperscan block-mode database used as a
+    prefilter. Returns None when hyperscan is unavailable or rejects a
+    pattern, in which case every pattern is tried on every prompt.
+    
+    A database compiled without ``utf8`` treats its input as bytes and is
+    only valid for ASCII prompts, which it scans faster, and for the default
+    patterns: in byte mode a caseless pattern's non-ASCII characters (e.g.
+    U+017F, U+212A) no longer fold onto the ASCII letters re.IGNORECASE
+    matches them with.
+    """
+    if hyperscan is None:
+        return None
+    
+    base_flags = hyperscan.HS_FLAG_SINGLEMATCH
+    if utf8:
+        base_flags |= hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP
+    flags = [
+        base_flags | hyperscan.HS_FLAG_CASELESS if pattern.flags & re.IGNORECASE else base_flags
+        for pattern in patterns
+    ]
+    
+    database = hyperscan.Database()
+    try:
+        database.compile(
+            expressions=[_to_hyperscan_expression(pattern.pattern) for pattern in patterns],
+            ids=list(range(len(patterns))),
+            elements=len(patterns),
+            flags=flags,
+        )
+    except (hyperscan.error, ValueError):
+        return None
+    return database
+
+
+@functools.lru_cache(maxsize=16)
+def _compile_pattern_tables(
+    pattern_set: Tuple[Tuple[str, Tuple[re.Pattern, ...]], ...]
+) -> _PatternTables:
+    """
+    Build the tables for a pattern set, given as (category, patterns) pairs.
+    Cached, so detectors sharing a pattern set compile the RE2 alternation
+    and Hyperscan database once. Scores are left empty: they depend on the
+    weights and are filled in by each detector.
+    """
+    patterns = tuple(pattern for _, category_patterns in pattern_set for pattern in category_patterns)
+    
+    # A category's trigger keywords only hold for the default patterns of
+    # that category, so one holding any other pattern is always scanned
+    trigger_groups = []
+    first_id = 0
+    for category, category_patterns in pattern_set:
+        triggers = None
+        if set(category_patterns).issubset(_DEFAULT_PATTERNS.get(category, ())):
+            triggers = frozenset(_CATEGORY_TRIGGERS[category])
+        pattern_ids = tuple(range(first_id, first_id + len(category_patterns)))
+        trigger_groups.append((triggers, pattern_ids))
+        first_id += len(category_patterns)
+    keyword_screen = all(triggers is not None for triggers, _ in trigger_groups)
+    
+    return _PatternTables(
+        patterns=patterns,
+        categories=tuple(
+            category for category, category_patterns in pattern_set for _ in category_patterns
+        ),
+        labels=tuple(
+            f"{category}: {pattern.pattern[:50]}"
+            for category, category_patterns in pattern_set for pattern in category_patterns
+        ),
+        category_bits=tuple(
+            int(_CATEGORY_BY_NAME.get(category, 0))
+            for category, category_patterns in pattern_set for _ in category_patterns
+        ),
+        scores=(),
+        # RE2 and Hyperscan only agree with re on the tokens and case folding
+        # the default patterns use (RE2's $ does not match before a trailing
+        # newline, Hyperscan does not fold U+0130 onto i), so custom patterns
+        # are left to the stdlib scan
+        re2_combined=_build_combined_pattern(patterns) if keyword_screen else None,
+        hs_db=_build_hyperscan_database(patterns, utf8=True) if keyword_screen else None,
+        hs_ascii_db=_build_hyperscan_database(patterns, utf8=False) if keyword_screen else None,
+        trigger_groups=tuple(trigger_groups),
+        keyword_screen=keyword_screen,
+    )
+
+
 class PromptInjectionDetector:
     """
     Multi-layered prompt injection detection system using pattern matching,
     heuristics, and semantic analysis.
     """
     
-    def __init__(self):
+    # Once pattern matches alone reach this score (CRITICAL) with at least
+    # this many matches, the heuristics cannot change the verdict and are skipped
+    EARLY_EXIT_SCORE = 70.0
+    EARLY_EXIT_MIN_PATTERNS = 3
+    
+    # Longer prompts are rarely repeated verbatim and are not worth caching
+    MAX_CACHED_PROMPT_LENGTH = 2048
+    
+    # Prompts longer than this score as a structural anomaly
+    LONG_PROMPT_LENGTH = 1000
+    
+    # Without Hyperscan, prompts up to this length are screened for trigger
+    # keywords before the pattern scan; longer ones almost always contain one
+    KEYWORD_SCREEN_MAX_LENGTH = 200
+    
+    def __init__(self, cache_size: int = 4096, collect_all: bool = False):
+        """
+        Args:
+            cache_size: Number of recent results to memoize (0 disables caching)
+            collect_all: Always run the heuristics, even once pattern matches
+                alone make the verdict a confident CRITICAL
+        """
+        self.cache_size = cache_size
+        self.collect_all = collect_all
+        self._cache: OrderedDict = OrderedDict()
+        self._cache_lock = threading.Lock()
         self.patterns = self._initialize_patterns()
         self.weights = self._initialize_weights()
-        
-    def _initialize_patterns(self) -> Dict[str, List[str]]:
+        self._hs_local = threading.local()
+        # Copies of patterns/weights the current tables were built from
+        self._tables_patterns = None
+        self._tables_weights = None
+        self._refresh_tables()
+    
+    def _initialize_patterns(self) -> Dict[str, List[re.Pattern]]:
         """Initialize detection patterns for various injection techniques"""
-        return {
-            # Direct instruction injection
-            'instruction_override': [
-                r'ignore\s+(all\s+)?(previous|above|prior)\s+(instructions?|prompts?|directions?)',
-                r'disregard\s+(previous|above|prior)\s+(instructions?|prompts?)',
-                r'forget\s+(all\s+)?(previous|above|prior)\s+(instructions?|prompts?)',
-                r'new\s+instructions?:',
-                r'system\s*:\s*ignore',
-            ],
-            
-            # Role manipulation
-            'role_manipulation': [
-                r'you\s+are\s+now\s+(a|an)\s+\w+',
-                r'act\s+as\s+(a|an)\s+\w+',
-                r'pretend\s+(you\s+are|to\s+be)',
-                r'from\s+now\s+on,?\s+you',
-                r'your\s+new\s+role\s+is',
-                r'SYSTEM\s*:\s*You\s+are',
-            ],
-            
-            # System prompt leakage attempts
-            'prompt_leakage': [
-                r'what\s+(are|were)\s+your\s+(original|initial|system)\s+(instructions?|prompts?)',
-                r'show\s+(me\s+)?(your\s+)?(system\s+)?(prompt|instructions?)',
-                r'print\s+(your\s+)?(system\s+)?(prompt|instructions?)',
-                r'reveal\s+(your\s+)?(system\s+)?(prompt|instructions?)',
-                r'what\s+are\s+you\s+programmed\s+to',
-            ],
-            
-            # Delimiter manipulation
-            'delimiter_injection': [
-                r'```\s*(system|assistant|user)',
-                r'<\|system\|>',
-                r'<\|assistant\|>',
-                r'<\|end\|>',
-                r'###\s*(Instruction|System)',
-                r'\[SYSTEM\]',
-                r'\[INST\]',
-            ],
-            
-            # Encoding/obfuscation attempts
-            'obfuscation': [
-                r'base64\s*:',
-                r'rot13\s*:',
-                r'hex\s*:',
-                r'unicode\s*:',
-                r'\\x[0-9a-fA-F]{2}',
-                r'&#\d+;',
-            ],
-            
-            # Jailbreak attempts
-            'jailbreak': [
-                r'DAN\s+mode',
-                r'developer\s+mode',
-                r'evil\s+(mode|mode)',
-                r'jailbreak',
-                r'unrestricted\s+mode',
-                r'bypass\s+(safety|filter|restriction)',
-            ],
-            
-            # Context manipulation
-            'context_manipulation': [
-                r'end\s+of\s+(conversation|chat|session)',
-                r'start\s+new\s+(conversation|chat|session)',
-                r'reset\s+(conversation|context)',
-                r'clear\s+(all\s+)?(previous\s+)?(context|memory)',
-            ],
+        # Fresh lists so customizing one detector leaves the others alone;
+        # the compiled patterns themselves are shared
+        return {category: list(patterns) for category, patterns in _DEFAULT_PATTERNS.items()}
+    
+    def _refresh_tables(self):
+        """
+        Rebuild the per-pattern tables if ``patterns`` or ``weights`` have been
+        customized since they were built, and drop the now stale cached
+        results. Pattern strings added by callers are compiled in place, case
+        insensitively, since they are not necessarily lower-case.
+        """
+        if self.patterns == self._tables_patterns and self.weights == self._tables_weights:
+            return
+        
+        with self._cache_lock:
+            for patterns in self.patterns.values():
+                for i, pattern in enumerate(patterns):
+                    if isinstance(pattern, str):
+                        patterns[i] = re.compile(pattern, re.IGNORECASE)
             
-            # Goal hijacking
-            'goal_hijacking': [
-                r'your\s+(real|actual|true)\s+goal\s+is',
-                r'instead\s+of\s+.*?,\s+you\s+(should|must|will)',
-                r'do\s+not\s+(follow|obey|listen\s+to)',
-                r'prioritize\s+this\s+over',
-            ],
-        }
+            tables = _compile_pattern_tables(tuple(
+                (category, tuple(patterns)) for category, patterns in self.patterns.items()
+            ))
+            self._tables = tables._replace(
+                scores=tuple(self.weights[category] * 10 for category in tables.categories)
+            )
+            self._tables_patterns = {
+                category: list(patterns) for category, patterns in self.patterns.items()
+            }
+            self._tables_weights = dict(self.weights)
+            self._cache.clear()
+    
+    def _candidate_ids(self, lower: str, tables: _PatternTables) -> Optional[List[int]]:
+        """
+        Return the ids, in ascending order, of the patterns that may match
+        the case-folded prompt, or None if every pattern has to be tried.
+        A pattern that matches nowhere in the prompt never contributes to
+        the fused alternation, so only the candidates need to be searched.
+        """
+        database = tables.hs_db
+        if tables.hs_ascii_db is not None and lower.isascii():
+            database = tables.hs_ascii_db
+        if database is None:
+            if len(lower) > self.KEYWORD_SCREEN_MAX_LENGTH:
+                return None
+            # Look each keyword up once, then keep the categories with one
+            # present; categories are numbered consecutively, so the ids stay sorted
+            present = {keyword for keyword in _TRIGGER_KEYWORDS if keyword in lower}
+            candidate_ids = []
+            for triggers, pattern_ids in tables.trigger_groups:
+                if triggers is None or not present.isdisjoint(triggers):
+                    candidate_ids.extend(pattern_ids)
+            return candidate_ids
+        
+        try:
+            data = lower.encode('utf-8')
+        except UnicodeEncodeError:  # lone surrogates: let re decide
+            return None
+        
+        # Scratch space must not be shared between concurrent scans, and is
+        # allocated for a particular database
+        scratches = getattr(self._hs_local, 'scratches', None)
+        if scratches is None:
+            scratches = self._hs_local.scratches = {}
+        scratch = scratches.get(database)
+        if scratch is None:
+            if len(scratches) >= 2:  # left over from tables since rebuilt
+                scratches.clear()
+            scratch = scratches[database] = hyperscan.Scratch(database)
+        
+        pattern_ids = []
+        database.scan(
+            data, match_event_handler=_collect_pattern_id, context=pattern_ids, scratch=scratch
+        )
+        pattern_ids.sort()
+        return pattern_ids
+    
+    def _scan(self, lower: str, tables: _PatternTables) -> Iterator[Tuple[int, int, int]]:
+        """
+        Yield (start, end, pattern_id) for the leftmost, non-overlapping
+        matches of all patterns in the case-folded prompt, i.e. the matches
+        of the fused alternation
+        """
+        patterns = tables.patterns
+        candidate_ids = self._candidate_ids(lower, tables)
+        if candidate_ids is None:
+            candidate_ids = range(len(patterns))
+        elif not candidate_ids:
+            return
+        
+        if tables.re2_combined is not None and lower.isascii():
+            # RE2 finds where each match starts; the alternative it took is the
+            # first pattern that matches there, which re identifies cheaply
+            # with anchored matches
+            matches = [(pattern_id, patterns[pattern_id].match) for pattern_id in candidate_ids]
+            for found in tables.re2_combined.finditer(lower.encode('ascii')):
+                start = found.start()
+                for pattern_id, match_at in matches:
+                    match = match_at(lower, start)
+                    if match is not None:
+                        yield start, match.end(), pattern_id
+                        break
+            return
+        
+        # Stdlib fallback. A fused alternation is much slower under re, which
+        # can only use each pattern's literal prefix to skip ahead when the
+        # pattern is searched on its own. So each pattern is searched
+        # separately, its next match is cached, and the leftmost one is taken
+        # (lowest pattern id on ties) until none remain. As in finditer, an
+        # empty match may not be followed by another empty match at the same
+        # position.
+        searches = [patterns[pattern_id].search for pattern_id in candidate_ids]
+        pending = [search(lower) for search in searches]
+        position = 0
+        empty_at = -1
+        while True:
+            best = None
+            best_index = -1
+            for index, match in enumerate(pending):
+                if match is None:
+                    continue
+                if match.start() < position or match.end() == empty_at:
+                    match = searches[index](lower, position)
+                    if match is not None and match.end() == empty_at:
+                        # search() clamps pos, so past the end means no match
+                        match = (searches[index](lower, position + 1)
+                                 if position < len(lower) else None)
+                    pending[index] = match
+                    if match is None:
+                        continue
+                if best is None or match.start() < best.start():
+                    best, best_index = match, index
+            if best is None:
+                return
+            yield best.start(), best.end(), candidate_ids[best_index]
+            position = best.end()
+            empty_at = position if best.start() == position else -1
     
     def _initialize_weights(self) -> Dict[str, float]:
         """Initialize risk weights for different pattern categories"""
@@ -143,40 +851,136 @@ class PromptInjectionDetector:
         """
         Main detection method that analyzes a prompt for injection attempts
         
+        Results for recently seen prompts are served from an LRU cache and the
+        same DetectionResult instance is returned for each hit (benign prompts
+        all share one instance), so callers must treat results as read-only.
+        
         Args:
             prompt: The user prompt to analyze
             
         Returns:
             DetectionResult with threat assessment
         """
-        detected_patterns = []
-        flagged_segments = []
+        self._refresh_tables()
+        
+        # Blank prompts contain no trigger keyword, so no default pattern can
+        # match them and only the length anomaly could score them
+        if ((not prompt or prompt.isspace()) and len(prompt) <= self.LONG_PROMPT_LENGTH and
+                self._tables.keyword_screen):
+            return _SAFE_RESULT
+        
+        # Keyed on the prompt itself: str caches its own hash, and an exact
+        # equality check means a crafted collision cannot reuse another
+        # prompt's verdict
+        cacheable = self._is_cacheable(prompt)
+        if cacheable:
+            with self._cache_lock:
+                result = self._cache_get(prompt)
+                if result is not None:
+                    return result
+        
+        result = self._analyze(prompt)
+        
+        if cacheable:
+            with self._cache_lock:
+                self._cache_put(prompt, result)
+        
+        return result
+    
+    def detect_many(self, prompts: List[str]) -> List[DetectionResult]:
+        """
+        Analyze a batch of prompts, returning results in input order
+        
+        Each distinct prompt in the batch is analyzed once. Results are
+        shared with the single-prompt cache, whose lock is taken once for
+        all lookups and once for all inserts rather than per prompt.
+        """
+        self._refresh_tables()
+        
+        results = dict.fromkeys(prompts)
+        if self.cache_size > 0:
+            with self._cache_lock:
+                for prompt in results:
+                    if self._is_cacheable(prompt):
+                        results[prompt] = self._cache_get(prompt)
+        
+        analyzed = []
+        for prompt, result in results.items():
+            if result is None:
+                results[prompt] = result = self._analyze(prompt)
+                if self._is_cacheable(prompt):
+                    analyzed.append((prompt, result))
+        
+        if analyzed:
+            with self._cache_lock:
+                for prompt, result in analyzed:
+                    self._cache_put(prompt, result)
+        
+        return [results[prompt] for prompt in prompts]
+    
+    def _is_cacheable(self, prompt: str) -> bool:
+        return self.cache_size > 0 and len(prompt) <= self.MAX_CACHED_PROMPT_LENGTH
+    
+    def _cache_get(self, prompt: str) -> Optional[DetectionResult]:
+        """Look up a cached result, marking it recently used (hold the cache lock)"""
+        result = self._cache.get(prompt)
+        if result is not None:
+            self._cache.move_to_end(prompt)
+        return result
+    
+    def _cache_put(self, prompt: str, result: DetectionResult):
+        """Cache a result, evicting the least recently used (hold the cache lock)"""
+        self._cache[prompt] = result
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+    
+    def _analyze(self, prompt: str) -> DetectionResult:
+        """Run the full detection pipeline on a prompt (uncached)"""
+        pattern_ids = []
+        spans = []
         risk_score = 0.0
+        category_mask = 0
+        
+        # Patterns are lower-case, so fold the prompt once instead of paying
+        # for case-insensitive matching in every scan
+        lower = prompt.translate(_CASE_FOLD_TABLE).lower()
         
         # Pattern-based detection
-        for category, patterns in self.patterns.items():
-            for pattern in patterns:
-                matches = re.finditer(pattern, prompt, re.IGNORECASE)
-                for match in matches:
-                    detected_patterns.append(f"{category}: {pattern[:50]}")
-                    flagged_segments.append({
-                        'segment': match.group(0),
-                        'category': category,
-                        'position': f"{match.start()}-{match.end()}"
-                    })
-                    risk_score += self.weights[category] * 10
-        
-        # Heuristic analysis
-        heuristic_score = self._heuristic_analysis(prompt)
-        risk_score += heuristic_score
-        
-        # Structural analysis
-        structural_score = self._structural_analysis(prompt)
-        risk_score += structural_score
+        tables = self._tables
+        scores = tables.scores
+        category_bits = tables.category_bits
+        for start, end, pattern_id in self._scan(lower, tables):
+            pattern_ids.append(pattern_id)
+            spans.append((start, end, pattern_id))
+            risk_score += scores[pattern_id]
+            category_mask |= category_bits[pattern_id]
+        
+        # The scan always runs to completion, since the sanitizer relies on
+        # flagged_segments covering every match; only the heuristics, which
+        # can no longer change a confident CRITICAL, are skipped
+        early_exit = (not self.collect_all and
+                      risk_score >= self.EARLY_EXIT_SCORE and
+                      len(pattern_ids) >= self.EARLY_EXIT_MIN_PATTERNS)
+        if not early_exit:
+            stats = _char_stats(prompt, lower)
+            
+            # Heuristic analysis
+            heuristic_score = self._heuristic_analysis(lower, stats)
+            risk_score += heuristic_score
+            
+            # Structural analysis
+            structural_score = self._structural_analysis(prompt, stats)
+            risk_score += structural_score
+        
+        if not pattern_ids and risk_score == 0:
+            return _SAFE_RESULT
         
         # Normalize risk score to 0-100
         risk_score = min(risk_score, 100.0)
         
+        detected_patterns = _PatternLabels(pattern_ids, tables.labels)
+        flagged_segments = _FlaggedSegments(prompt, spans, tables.categories)
+        
         # Determine threat level and confidence
         threat_level, confidence = self._calculate_threat_level(
             risk_score, len(detected_patterns)
@@ -193,62 +997,63 @@ class PromptInjectionDetector:
             detected_patterns=detected_patterns,
             risk_score=risk_score,
             explanation=explanation,
-            flagged_segments=flagged_segments
+            flagged_segments=flagged_segments,
+            early_exit=early_exit,
+            category_mask=Category(category_mask)
         )
     
-    def _heuristic_analysis(self, prompt: str) -> float:
-        """Analyze prompt using heuristics"""
+    def _heuristic_analysis(self, lower: str, stats: _CharStats) -> float:
+        """Analyze prompt using heuristics (``lower`` is the case-folded prompt)"""
         score = 0.0
         
         # Check for excessive special characters
-        special_char_ratio = len(re.findall(r'[^a-zA-Z0-9\s]', prompt)) / max(len(prompt), 1)
+        special_char_ratio = stats.special_count / max(stats.length, 1)
         if special_char_ratio > 0.3:
             score += 5.0
         
         # Check for unusual capitalization patterns
-        if re.search(r'[A-Z]{10,}', prompt):
+        if stats.max_caps_run >= 10:
             score += 3.0
         
-        # Check for repeated instruction words
-        instruction_words = ['ignore', 'disregard', 'forget', 'override', 'bypass']
-        for word in instruction_words:
-            count = len(re.findall(word, prompt, re.IGNORECASE))
-            if count > 1:
-                score += count * 2.0
+        # Check for repeated instruction words (a repeat needs two of them)
+        words = _find_instruction_words(lower)
+        if len(words) > 1:
+            for count in Counter(words).values():
+                if count > 1:
+                    score += count * 2.0
         
         # Check for multiple delimiter types
-        delimiter_count = len(re.findall(r'[```\[\]<>|#]{3,}', prompt))
+        delimiter_count = stats.delimiter_runs
         if delimiter_count > 2:
             score += delimiter_count * 2.0
         
         # Check for system-related keywords
-        system_keywords = ['system', 'admin', 'root', 'developer', 'debug']
-        system_count = sum(len(re.findall(kw, prompt, re.IGNORECASE)) for kw in system_keywords)
+        system_count = stats.system_keywords
         if system_count > 2:
             score += system_count * 1.5
         
         return score
     
-    def _structural_analysis(self, prompt: str) -> float:
+    def _structural_analysis(self, prompt: str, stats: _CharStats) -> float:
         """Analyze structural anomalies in the prompt"""
         score = 0.0
         
         # Check for nested instructions
-        if re.search(r'\[.*\[.*\].*\]', prompt):
+        if stats.nested_brackets:
             score += 5.0
         
         # Check for multi-language mixing (basic)
-        if re.search(r'[а-яА-Я]', prompt) and re.search(r'[a-zA-Z]', prompt):
+        if stats.has_cyrillic and stats.has_latin:
             score += 3.0
         
         # Check for code injection patterns
-        code_patterns = [r'eval\s*\(', r'exec\s*\(', r'__import__', r'system\s*\(']
-        for pattern in code_patterns:
-            if re.search(pattern, prompt):
-                score += 8.0
+        if any(marker in prompt for marker in _CODE_MARKERS):
+            for pattern in _CODE_RES:
+                if pattern.search(prompt):
+                    score += 8.0
         
         # Check for prompt length anomalies
-        if len(prompt) > 1000:
+        if stats.length > self.LONG_PROMPT_LENGTH:
             score += 2.0
         
         return score
@@ -271,7 +1076,7 @@ class PromptInjectionDetector:
             return ThreatLevel.SAFE, confidence
     
     def _generate_explanation(
-        self, threat_level: ThreatLevel, patterns: List[str], score: float
+        self, threat_level: ThreatLevel, patterns: Sequence[str], score: float
     ) -> str:
         """Generate human-readable explanation of the detection"""
         if threat_level == ThreatLevel.SAFE:
@@ -296,54 +1101,81 @@ class PromptInjectionDetector:
 class PromptSanitizer:
     """Sanitizes potentially malicious prompts"""
     
-    @staticmethod
-    def sanitize(prompt: str, detection_result: DetectionResult) -> str:
+    # Code fences, special tokens and instruction markers
+    _SANITIZE_RE = re.compile(r'```\s*(?:system|assistant|user)|<\|.*?\|>|\[SYSTEM\]|\[INST\]')
+    # Literals every _SANITIZE_RE match starts with
+    _DELIMITER_MARKERS = ('```', '<|', '[SYSTEM]', '[INST]')
+    
+    @classmethod
+    def sanitize(cls, prompt: str, detection_result: DetectionResult) -> str:
         """Remove or neutralize detected injection attempts"""
-        sanitized = prompt
-        
-        # Remove flagged segments
-        for segment in detection_result.flagged_segments:
-            sanitized = sanitized.replace(segment['segment'], '[REDACTED]')
+        # Splice the flagged segments out by offset in a single pass,
+        # merging overlapping segments into one redaction
+        parts = []
+        cursor = 0
+        for start, end in sorted((segment['start'], segment['end'])
+                                 for segment in detection_result.flagged_segments):
+            if start < cursor:
+                cursor = max(cursor, end)
+                continue
+            parts.append(prompt[cursor:start])
+            parts.append('[REDACTED]')
+            cursor = end
+        parts.append(prompt[cursor:])
         
-        # Remove common delimiters
-        sanitized = re.sub(r'```\s*(system|assistant|user)', '', sanitized)
-        sanitized = re.sub(r'<\|.*?\|>', '', sanitized)
-        sanitized = re.sub(r'\[SYSTEM\]|\[INST\]', '', sanitized)
+        sanitized = ''.join(parts)
         
+        # Remove common delimiters; substring checks rule most prompts out
+        # far more cheaply than the regex scan
+        if any(marker in sanitized for marker in cls._DELIMITER_MARKERS):
+            sanitized = cls._SANITIZE_RE.sub('', sanitized)
         return sanitized.strip()
 
 
 class PromptInjectionMonitor:
     """Monitoring and logging system for prompt injections"""
     
-    def __init__(self):
-        self.detection_log = []
+    def __init__(self, max_log_entries: int = 10000):
+        """
+        Args:
+            max_log_entries: Number of most recent detections kept in the log
+        """
+        self.detection_log = deque(maxlen=max_log_entries)
+        # Running aggregates cover every detection, including those that
+        # have already rotated out of the bounded log
+        self._total = 0
+        self._score_sum = 0.0
+        # Indexed by ThreatLevel.value
+        self._threat_counts = [0] * len(ThreatLevel)
     
     def log_detection(self, prompt: str, result: DetectionResult):
         """Log a detection event"""
+        level = result.threat_level
         log_entry = {
             'timestamp': self._get_timestamp(),
             'prompt_hash': self._hash_prompt(prompt),
-            'threat_level': result.threat_level.name,
+            'threat_level': level.name,
             'risk_score': result.risk_score,
             'patterns_detected': len(result.detected_patterns),
         }
         self.detection_log.append(log_entry)
+        
+        self._total += 1
+        self._score_sum += result.risk_score
+        self._threat_counts[level.value] += 1
     
     def get_statistics(self) -> Dict:
         """Get detection statistics"""
-        if not self.detection_log:
+        if not self._total:
             return {'total_detections': 0}
         
-        threat_counts = {}
-        for entry in self.detection_log:
-            level = entry['threat_level']
-            threat_counts[level] = threat_counts.get(level, 0) + 1
-        
         return {
-            'total_detections': len(self.detection_log),
-            'threat_distribution': threat_counts,
-            'avg_risk_score': sum(e['risk_score'] for e in self.detection_log) / len(self.detection_log)
+            'total_detections': self._total,
+            'threat_distribution': {
+                level.name: count
+                for level, count in zip(ThreatLevel, self._threat_counts) if count
+            },
+            'avg_risk_score': self._score_sum / self._total
         }
     
     @staticmethod
@@ -394,7 +1226,7 @@ if __name__ == "__main__":
             for pattern in result.detected_patterns[:3]:
                 print(f"  - {pattern}")
         
-        if result.threat_level.value >= ThreatLevel.MEDIUM.value:
+        if result.threat_level >= ThreatLevel.MEDIUM:
             sanitized = sanitizer.sanitize(prompt, result)
             print(f"\nSanitized: '{sanitized}'")
     